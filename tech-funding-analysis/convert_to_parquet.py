@@ -0,0 +1,31 @@
+"""One-off conversion of the funding CSV into a typed Parquet file.
+
+Amounts and dates are parsed here once (unparseable values become null), so
+the dashboard reads typed, columnar data instead of re-parsing the CSV. Re-run
+``python convert_to_parquet.py`` whenever ``data/tech_fundings.csv`` changes;
+the CSV's SHA-256 is stored in the Parquet metadata so the dashboard can warn
+when the two drift apart.
+"""
+import hashlib
+import os
+
+import polars as pl
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.path.join(APP_DIR, 'data', 'tech_fundings.csv')
+PARQUET_PATH = os.path.join(APP_DIR, 'data', 'tech_fundings.parquet')
+
+with open(CSV_PATH, 'rb') as f:
+    csv_sha256 = hashlib.sha256(f.read()).hexdigest()
+
+(
+    pl.read_csv(
+        CSV_PATH,
+        schema_overrides={'Funding Amount (USD)': pl.String, 'Funding Date': pl.String},
+    )
+    .with_columns(
+        pl.col('Funding Amount (USD)').cast(pl.Float64, strict=False),
+        pl.col('Funding Date').str.strptime(pl.Date, '%b-%y', strict=False),
+    )
+    .write_parquet(PARQUET_PATH, metadata={'source_csv_sha256': csv_sha256})
+)
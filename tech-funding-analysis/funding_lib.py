@@ -0,0 +1,253 @@
+"""Cached cleaning and aggregation shared by the funding dashboards.
+
+Everything here is keyed on ``current_data_version()`` and memoized with
+``functools.lru_cache``. The caches live in this imported module rather than
+in the dashboard script, so they survive preswald's full reruns, which
+re-execute the script with fresh globals.
+"""
+import functools
+import hashlib
+import math
+import os
+from typing import NamedTuple
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11; tomli is a preswald dependency
+    import tomli as tomllib
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import polars as pl
+from plotly.colors import qualitative
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Input of convert_to_parquet.py, checked by parquet_is_stale().
+SOURCE_CSV_PATH = os.path.join(APP_DIR, 'data', 'tech_fundings.csv')
+
+
+def _fundings_source_path():
+    """Path of the ``[data.fundings_data]`` source configured in preswald.toml.
+
+    The Polars loader and preswald's DuckDB source (used by ``query()``) both
+    read this one entry, so the toml stays the single source of truth.
+    """
+    with open(os.path.join(APP_DIR, 'preswald.toml'), 'rb') as f:
+        source = tomllib.load(f)['data']['fundings_data']
+    if source.get('type') != 'parquet':
+        raise ValueError(f"fundings_data must be a parquet source, got {source.get('type')!r}")
+    return os.path.join(APP_DIR, source['path'])
+
+
+MAX_TOP_N = 20
+STAGE_ORDER = ['Pre-Seed', 'Seed', 'Angel', 'Series A', 'Series B', 'Series C', 'Series D', 'Series E', 'Series F', 'Series G', 'Series H', 'ICO', 'Debt Financing', 'Private Equity', 'Crowdfunding', 'Grant', 'Unknown', 'Undisclosed']
+
+
+def current_data_version():
+    """``(path, mtime)`` of the configured data file, used as the cache key for everything below.
+
+    The toml is re-read on every call, so pointing the source at another file
+    or editing the file in place both produce a new version without a restart.
+    """
+    data_path = _fundings_source_path()
+    return data_path, os.path.getmtime(data_path)
+
+
+def parquet_is_stale(data_version):
+    """Whether ``data/tech_fundings.csv`` differs from the CSV the Parquet file was converted from.
+
+    Compares SHA-256 hashes rather than mtimes, which a git checkout does not
+    preserve. Files without the stored hash (e.g. another configured source)
+    are never reported as stale.
+    """
+    if not os.path.exists(SOURCE_CSV_PATH):
+        return False
+    return _parquet_is_stale(data_version, os.path.getmtime(SOURCE_CSV_PATH))
+
+
+@functools.lru_cache(maxsize=1)
+def _parquet_is_stale(data_version, csv_mtime):
+    data_path, _ = data_version
+    converted_from = pl.read_parquet_metadata(data_path).get('source_csv_sha256')
+    with open(SOURCE_CSV_PATH, 'rb') as f:
+        return converted_from is not None and converted_from != hashlib.sha256(f.read()).hexdigest()
+
+
+def fmt_money(s):
+    """Format a numeric Series as whole-dollar strings, e.g. ``$1,234``."""
+    return s.map('${:,.0f}'.format)
+
+
+def nlargest_positions(values, k):
+    """Positions of the ``k`` largest values, ordered like ``nlargest(k, keep='first')``.
+
+    ``np.partition`` finds the k-th largest value in O(N); only rows at or above
+    it (ties included) are then sorted.
+    """
+    if len(values) <= k:
+        return np.argsort(-values, kind='stable')
+    kth_largest = np.partition(values, len(values) - k)[len(values) - k]
+    candidates = np.flatnonzero(values >= kth_largest)
+    return candidates[np.argsort(-values[candidates], kind='stable')][:k]
+
+
+def _fmt_si(x):
+    """Two-significant-digit SI label (e.g. ``18G``), as Plotly's ``'.2s'`` format."""
+    if x <= 0:
+        return f"{x:.2g}"
+    rounded = float(f"{x:.2g}")
+    exponent = math.floor(math.log10(rounded))
+    prefix_exponent = min(max(exponent // 3, 0), 4) * 3
+    decimals = max(0, 1 - (exponent - prefix_exponent))
+    return f"{rounded / 10 ** prefix_exponent:.{decimals}f}{['', 'k', 'M', 'G', 'T'][prefix_exponent // 3]}"
+
+
+class CleanedFundings(NamedTuple):
+    """Everything ``load_clean()`` derives from one data version."""
+
+    df_cleaned: pd.DataFrame
+    total_funding: float
+    average_funding: float
+    median_funding: float
+    cutoff_threshold: float
+    region_totals: pd.DataFrame
+    vertical_totals: pd.DataFrame
+    region_options: list
+    recent_positions: np.ndarray
+
+
+@functools.lru_cache(maxsize=1)
+def load_clean(data_version):
+    """Clean and aggregate the funding data, cached per data file version.
+
+    Everything is built from a single lazy Polars plan so the column-pruned
+    Parquet scan and null filtering are shared by every aggregate collected here.
+    """
+    data_path, _ = data_version
+    lf_cleaned = (
+        pl.scan_parquet(data_path)
+        .select(['Company', 'Region', 'Vertical', 'Funding Amount (USD)', 'Funding Stage', 'Funding Date'])
+        .drop_nulls(['Funding Amount (USD)', 'Funding Date'])
+    )
+    df_cleaned_pl, overall_stats, region_totals, vertical_totals = pl.collect_all([
+        lf_cleaned,
+        lf_cleaned.select(
+            total=pl.col('Funding Amount (USD)').sum(),
+            average=pl.col('Funding Amount (USD)').mean(),
+            median=pl.col('Funding Amount (USD)').median(),
+            # Box-plot outlier cutoff, computed once per data version alongside the totals.
+            cutoff=pl.col('Funding Amount (USD)').quantile(0.995, interpolation='linear'),
+        ),
+        # The sliders never show more than MAX_TOP_N bars, so a heap-based top_k
+        # replaces a full sort of every group's total.
+        (
+            lf_cleaned.drop_nulls('Region').group_by('Region').agg(pl.col('Funding Amount (USD)').sum())
+            .top_k(MAX_TOP_N, by='Funding Amount (USD)')
+            .sort('Funding Amount (USD)', descending=True)
+        ),
+        (
+            lf_cleaned.drop_nulls('Vertical').group_by('Vertical').agg(pl.col('Funding Amount (USD)').sum())
+            .top_k(MAX_TOP_N, by='Funding Amount (USD)')
+            .sort('Funding Amount (USD)', descending=True)
+            .with_columns(pl.col('Vertical').str.split(',').list.first().str.strip_chars())
+        ),
+    ])
+    # Arrow-backed columns avoid per-value Python objects (e.g. Company strings);
+    # low-cardinality labels become categoricals so group-bys and filters compare int codes.
+    df_cleaned = df_cleaned_pl.to_pandas(use_pyarrow_extension_array=True).astype({'Region': 'category', 'Vertical': 'category', 'Funding Stage': 'category'})
+    # Bar labels are formatted once here rather than by Plotly on every render.
+    region_totals = region_totals.to_pandas().assign(label=lambda d: d['Funding Amount (USD)'].map(_fmt_si))
+    vertical_totals = vertical_totals.to_pandas().assign(label=lambda d: d['Funding Amount (USD)'].map(_fmt_si))
+    # The region dropdown only changes with the data, so build its options here too.
+    region_options = ['All'] + sorted(df_cleaned['Region'].cat.categories.tolist())
+    # Row positions of the 20 most recent deals for the 'All' table, from the dates' int day counts.
+    recent_positions = nlargest_positions(df_cleaned_pl['Funding Date'].to_physical().to_numpy(), 20)
+    total_funding, average_funding, median_funding, cutoff_threshold = overall_stats.row(0)
+    return CleanedFundings(df_cleaned, total_funding, average_funding, median_funding, cutoff_threshold, region_totals, vertical_totals, region_options, recent_positions)
+
+
+@functools.lru_cache(maxsize=32)
+def top_regions(n, data_version):
+    """Top ``n`` regions by total funding, reusing the cached group-by."""
+    return load_clean(data_version).region_totals.head(n)
+
+
+@functools.lru_cache(maxsize=32)
+def top_verticals(n, data_version):
+    """Top ``n`` verticals by total funding, labelled by their first listed vertical."""
+    return load_clean(data_version).vertical_totals.head(n)
+
+
+# Figures are cached as JSON per (n, data version): widget reruns skip figure
+# construction, and preswald gets a fresh Figure it is free to mutate.
+@functools.lru_cache(maxsize=32)
+def region_bar_json(n, data_version):
+    """Bar chart of the top ``n`` regions as Plotly JSON."""
+    region_funding = top_regions(n, data_version)
+    bar_colors = [qualitative.Pastel[i % len(qualitative.Pastel)] for i in range(len(region_funding))]
+    fig_region = go.Figure(go.Bar(x=region_funding['Region'], y=region_funding['Funding Amount (USD)'], text=region_funding['label'], marker_color=bar_colors))
+    fig_region.update_layout(title=f'Total Funding by Top {n} Regions', xaxis_title='Region', yaxis_title='Total Funding (USD)', xaxis={'categoryorder':'total descending'}, template='plotly_white', title_x=0.5, showlegend=False)
+    return fig_region.to_json()
+
+
+@functools.lru_cache(maxsize=32)
+def vertical_bar_json(n, data_version):
+    """Bar chart of the top ``n`` verticals as Plotly JSON."""
+    vertical_funding = top_verticals(n, data_version)
+    bar_colors = [qualitative.Set3[i % len(qualitative.Set3)] for i in range(len(vertical_funding))]
+    fig_vertical = go.Figure(go.Bar(x=vertical_funding['Vertical'], y=vertical_funding['Funding Amount (USD)'], text=vertical_funding['label'], marker_color=bar_colors))
+    fig_vertical.update_layout(title=f'Total Funding by Top {n} Verticals', xaxis_title='Vertical', yaxis_title='Total Funding (USD)', xaxis={'categoryorder':'total descending'}, template='plotly_white', title_x=0.5, showlegend=False)
+    return fig_vertical.to_json()
+
+
+@functools.lru_cache(maxsize=1)
+def stage_box_json(data_version):
+    """Per-stage funding box plot as Plotly JSON, or None when nothing is left to plot."""
+    cleaned = load_clean(data_version)
+    df_cleaned, cutoff_threshold = cleaned.df_cleaned, cleaned.cutoff_threshold
+    # The ordered stage column lives only on this slice; the cached df_cleaned is never mutated.
+    df_plot_data = (
+        df_cleaned.loc[df_cleaned['Funding Amount (USD)'] < cutoff_threshold, ['Funding Stage', 'Funding Amount (USD)']]
+        .assign(stage_cat=lambda d: d['Funding Stage'].cat.set_categories(STAGE_ORDER, ordered=True))
+        .dropna(subset=['stage_cat'])
+    )
+    if df_plot_data.empty:
+        return None
+    # Send Plotly five-number summaries per stage instead of every deal.
+    stage_quantiles = df_plot_data.groupby('stage_cat', observed=True)['Funding Amount (USD)'].quantile([0.0, 0.25, 0.5, 0.75, 1.0]).unstack()
+    stage_colors = qualitative.Plotly
+    fig_stage = go.Figure()
+    for i, (stage, q) in enumerate(stage_quantiles.iterrows()):
+        fig_stage.add_trace(go.Box(x=[stage], name=stage, lowerfence=[q[0.0]], q1=[q[0.25]], median=[q[0.5]], q3=[q[0.75]], upperfence=[q[1.0]], marker_color=stage_colors[i % len(stage_colors)], boxpoints=False))
+    fig_stage.update_layout(title='Funding Distribution by Stage (Log Scale, Outliers Excluded)', xaxis_title="Funding Stage", yaxis_title='Funding Amount (USD, Log Scale)', yaxis_type='log', template='plotly_white', title_x=0.5, showlegend=False)
+    return fig_stage.to_json()
+
+
+@functools.lru_cache(maxsize=1)
+def stage_benchmarks(data_version):
+    """Per-stage deal count, total, average and median.
+
+    Aggregated from the cached ``df_cleaned`` rather than preswald's DuckDB copy,
+    which is loaded once at ``connect()`` and would lag behind a changed file.
+    Rows are sorted by stage and the dollar columns formatted here so cached
+    results are display-ready.
+    """
+    df_cleaned = load_clean(data_version).df_cleaned
+    stage_summary = df_cleaned.groupby('Funding Stage', observed=True)['Funding Amount (USD)'].agg(['count', 'sum', 'mean', 'median']).reset_index()
+    stage_summary.columns = ['Funding Stage', 'Number of Deals', 'Total Funding (USD)', 'Average Funding (USD)', 'Median Funding (USD)']
+    # Ordered categorical: canonical stages first, any unlisted labels after them.
+    extra_stages = sorted(set(stage_summary['Funding Stage']) - set(STAGE_ORDER))
+    stage_summary['Funding Stage'] = stage_summary['Funding Stage'].cat.set_categories(STAGE_ORDER + extra_stages, ordered=True)
+    stage_summary = stage_summary.sort_values('Funding Stage', ignore_index=True)
+    money_cols = ['Total Funding (USD)', 'Average Funding (USD)', 'Median Funding (USD)']
+    stage_summary[money_cols] = stage_summary[money_cols].apply(fmt_money)
+    return stage_summary
+
+
+@functools.lru_cache(maxsize=1)
+def top_rounds(data_version):
+    """The 10 largest individual rounds, in ``nlargest(10, keep='first')`` order."""
+    df_cleaned = load_clean(data_version).df_cleaned
+    positions = nlargest_positions(df_cleaned['Funding Amount (USD)'].to_numpy(dtype='float64'), 10)
+    return df_cleaned.iloc[positions][['Company', 'Funding Amount (USD)', 'Vertical', 'Region', 'Funding Stage', 'Funding Date']].reset_index(drop=True)